@@ -1,99 +1,222 @@
 import streamlit as st
 import sqlite3
 import io
-from PIL import Image
+from PIL import Image, ImageOps
 import uuid
-import mimetypes
 from datetime import datetime
-import base64
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+import bcrypt
+from dotenv import load_dotenv
+
+load_dotenv()
 
 DB_PATH = "gallery.db"
+# bcrypt hash of the author password, e.g. from bcrypt.hashpw(b"...", bcrypt.gensalt())
+ADMIN_HASH = os.environ.get("ADMIN_HASH", "")
+IMAGE_DIR = "images"
+THUMBNAIL_SIZE = (256, 256)
+MAX_IMAGE_SIZE = (2048, 2048)
+# st.image scales anything wider than this down again on every render
+DISPLAY_WIDTH = 1460
+THUMBNAIL_BACKFILL_BATCH = 32
+IMAGE_SIGNATURES = (b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n")
+# 8-bit modes JPEG/PNG can hold without losing the source's tonal range
+EIGHT_BIT_MODES = ("RGB", "RGBA", "L", "LA", "P", "1")
+# The uploader only accepts these extensions
+MIME_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png"}
+GALLERY_CSS = """
+<style>
+.folder-card {background: #f9f9f9; border-radius: 8px; padding: 15px; margin-bottom: 20px; box-shadow: 0 4px 8px rgba(0,0,0,0.1);}
+.folder-header {font-size:1.5em; color:#333; margin-bottom:10px;}
+.image-grid {display:flex; flex-wrap:wrap; gap:10px;}
+img {border-radius:4px; max-width:100px; object-fit:cover;}
+</style>
+"""
+GRID_PAGE_SIZE = 12
+SURVEY_PAGE_SIZE = 10
 
 # -------------------------------
 # Helper Functions
 # -------------------------------
-def image_to_base64(image_data):
-    """Convert image data (bytes) to base64 string."""
-    return base64.b64encode(image_data).decode('utf-8') if isinstance(image_data, bytes) else image_data.encode('utf-8')
-
-def thumbnail_to_bytes(image):
-    """Convert PIL Image to bytes for thumbnail."""
+def to_8bit(image):
+    """Scale 16/32-bit grayscale down to 8 bits; a plain convert() clips it to white."""
+    if image.mode.startswith("I"):
+        return image.convert("I").point(lambda i: i * (1 / 256)).convert("L")
+    return image
+
+def display_bytes(image, quality, **params):
+    """Encode a PIL Image as PNG if it has alpha, otherwise JPEG.
+
+    st.image only forwards JPEG (opaque) and PNG (RGBA) bytes unchanged; any
+    other format or mode is decoded and re-encoded on every render.
+    """
+    image = to_8bit(image)
     output = io.BytesIO()
-    image.save(output, format="PNG")
+    if "A" in image.mode or "transparency" in image.info:
+        image.convert("RGBA").save(output, format="PNG", **params)
+    else:
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(output, format="JPEG", quality=quality, **params)
     return output.getvalue()
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS folders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            folder TEXT UNIQUE NOT NULL,
-            name TEXT NOT NULL,
-            age INTEGER NOT NULL,
-            profession TEXT NOT NULL,
-            category TEXT NOT NULL
-        )
-    """)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS images (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            folder TEXT NOT NULL,
-            image_data BLOB NOT NULL,
-            download_allowed BOOLEAN NOT NULL DEFAULT 1,
-            FOREIGN KEY(folder) REFERENCES folders(folder)
-        )
-    """)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS surveys (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            folder TEXT NOT NULL,
-            rating INTEGER NOT NULL,
-            feedback TEXT,
-            timestamp TEXT NOT NULL,
-            FOREIGN KEY(folder) REFERENCES folders(folder)
-        )
+def thumbnail_to_bytes(image):
+    """Convert PIL Image to JPEG/PNG bytes for thumbnail."""
+    return display_bytes(image, quality=75)
+
+def recompress_upload(img, original_size):
+    """Re-encode a decoded, capped upload as JPEG/PNG; returns (bytes, extension) or None.
+
+    None means the original bytes should be kept: the copy is not smaller, or the
+    mode is outside EIGHT_BIT_MODES (16-bit, CMYK, ...).
+    """
+    if img.mode not in EIGHT_BIT_MODES:
+        return None
+    # The profile only describes the pixels if display_bytes() doesn't convert them
+    icc_profile = img.info.get("icc_profile") if img.mode in ("RGB", "RGBA", "L") else None
+    data = display_bytes(img, quality=85, icc_profile=icc_profile)
+    if len(data) >= original_size:
+        return None
+    return data, ".png" if data.startswith(b"\x89PNG") else ".jpg"
+
+def check_admin_password(password):
+    """Verify password against ADMIN_HASH; bcrypt compares in constant time."""
+    try:
+        return bcrypt.checkpw(password.encode("utf-8"), ADMIN_HASH.encode("utf-8"))
+    except ValueError:
+        return False
+
+def has_image_header(image_data):
+    """Check the leading magic bytes for a JPEG/PNG signature without decoding."""
+    return bytes(image_data[:16]).startswith(IMAGE_SIGNATURES)
+
+def make_thumbnail(img):
+    """Shrink a decoded image and return its thumbnail bytes."""
+    # thumbnail() can't reduce 16-bit modes, so scale them to 8 bits first
+    img = to_8bit(img)
+    img.thumbnail(THUMBNAIL_SIZE, Image.Resampling.BILINEAR)
+    return thumbnail_to_bytes(img)
+
+def draft_thumbnail(image_data):
+    """Build thumbnail bytes from stored image bytes without a full-resolution decode."""
+    img = Image.open(io.BytesIO(image_data))
+    # Let libjpeg downscale while decoding; a no-op for other formats
+    img.draft("RGB", (THUMBNAIL_SIZE[0] * 2, THUMBNAIL_SIZE[1] * 2))
+    return make_thumbnail(ImageOps.exif_transpose(img))
+
+@st.cache_resource
+def get_conn():
+    """Open the shared SQLite connection once per process; every helper reuses it."""
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=256)
+    conn.row_factory = sqlite3.Row
+    # page_size only takes effect on a new database, so it must precede the switch to WAL
+    conn.executescript("""
+        PRAGMA page_size=16384;
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA cache_size=-64000;
+        PRAGMA mmap_size=268435456;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA optimize=0x10002;
     """)
-    default_folders = [
-        {"name": "Xiaoqing", "age": 26, "profession": "Graphic Designer", "category": "Artists", "folder": "xiaojing"},
-        {"name": "Yuena", "age": 29, "profession": "Painter", "category": "Artists", "folder": "yuena"},
-        {"name": "Yijie", "age": 30, "profession": "Literature Teacher", "category": "Teachers", "folder": "yijie"},
-        {"name": "Yajie", "age": 27, "profession": "Musician", "category": "Artists", "folder": "yajie"},
-        {"name": "Yu", "age": 47, "profession": "Data Scientist", "category": "Engineers", "folder": "yu"},
-        {"name": "Chunyang", "age": 25, "profession": "Software Developer", "category": "Engineers", "folder": "chunyang"},
-        {"name": "Haokan", "age": 34, "profession": "History Teacher", "category": "Teachers", "folder": "haoran"},
-    ]
-    for folder_data in default_folders:
-        c.execute("SELECT COUNT(*) FROM folders WHERE folder = ?", (folder_data["folder"],))
-        if c.fetchone()[0] == 0:
-            c.execute("""
-                INSERT INTO folders (folder, name, age, profession, category)
-                VALUES (?, ?, ?, ?, ?)
-            """, (folder_data["folder"], folder_data["name"], folder_data["age"],
-                  folder_data["profession"], folder_data["category"]))
-    conn.commit()
-    conn.close()
+    return conn
 
+@st.cache_resource
+def get_db_lock():
+    """Serialize all reads and writes on the shared connection across sessions."""
+    return threading.Lock()
+
+@st.cache_resource
+def init_db():
+    """Create and migrate the schema; cached so it runs once per process, not on every rerun."""
+    conn = get_conn()
+    with get_db_lock(), conn:
+        # One script inside one transaction; the BEGIN stays open for the
+        # migration and seeding below and commits when the block exits
+        conn.executescript("""
+            BEGIN;
+            CREATE TABLE IF NOT EXISTS folders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                folder TEXT UNIQUE NOT NULL,
+                name TEXT NOT NULL,
+                age INTEGER NOT NULL,
+                profession TEXT NOT NULL,
+                category TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS images (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                folder TEXT NOT NULL,
+                image_data BLOB NOT NULL,
+                download_allowed BOOLEAN NOT NULL DEFAULT 1,
+                path TEXT,
+                thumbnail BLOB,
+                mime TEXT,
+                FOREIGN KEY(folder) REFERENCES folders(folder)
+            );
+            CREATE TABLE IF NOT EXISTS surveys (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                folder TEXT NOT NULL,
+                rating INTEGER NOT NULL,
+                feedback TEXT,
+                timestamp TEXT NOT NULL,
+                FOREIGN KEY(folder) REFERENCES folders(folder)
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_images_folder_name ON images(folder, name);
+            -- Survey listings walk a folder's entries newest-first by id
+            CREATE INDEX IF NOT EXISTS idx_surveys_folder_id ON surveys(folder, id);
+        """)
+        c = conn.cursor()
+        # Older databases predate the on-disk image columns
+        c.execute("PRAGMA table_info(images)")
+        image_columns = {r["name"] for r in c.fetchall()}
+        for column, column_type in (("path", "TEXT"), ("thumbnail", "BLOB"), ("mime", "TEXT")):
+            if column not in image_columns:
+                c.execute(f"ALTER TABLE images ADD COLUMN {column} {column_type}")
+        if "mime" not in image_columns:
+            # Uploads have only ever accepted JPEG and PNG
+            c.execute("UPDATE images SET mime = CASE WHEN lower(name) LIKE '%.png' THEN 'image/png' ELSE 'image/jpeg' END")
+        # Rows stored before thumbnails existed would otherwise send their full image to the grid
+        missing = [r["id"] for r in c.execute("SELECT id FROM images WHERE thumbnail IS NULL")]
+        for start in range(0, len(missing), THUMBNAIL_BACKFILL_BATCH):
+            batch = missing[start:start + THUMBNAIL_BACKFILL_BATCH]
+            c.execute(f"SELECT id, image_data FROM images WHERE id IN ({','.join('?' * len(batch))})", batch)
+            thumbnails = get_thumbnail_pool().map(_backfill_thumbnail, c.fetchall())
+            c.executemany("UPDATE images SET thumbnail = ? WHERE id = ?", [t for t in thumbnails if t is not None])
+        default_folders = [
+            {"name": "Xiaoqing", "age": 26, "profession": "Graphic Designer", "category": "Artists", "folder": "xiaojing"},
+            {"name": "Yuena", "age": 29, "profession": "Painter", "category": "Artists", "folder": "yuena"},
+            {"name": "Yijie", "age": 30, "profession": "Literature Teacher", "category": "Teachers", "folder": "yijie"},
+            {"name": "Yajie", "age": 27, "profession": "Musician", "category": "Artists", "folder": "yajie"},
+            {"name": "Yu", "age": 47, "profession": "Data Scientist", "category": "Engineers", "folder": "yu"},
+            {"name": "Chunyang", "age": 25, "profession": "Software Developer", "category": "Engineers", "folder": "chunyang"},
+            {"name": "Haokan", "age": 34, "profession": "History Teacher", "category": "Teachers", "folder": "haoran"},
+        ]
+        c.executemany("""
+            INSERT OR IGNORE INTO folders (folder, name, age, profession, category)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(d["folder"], d["name"], d["age"], d["profession"], d["category"]) for d in default_folders])
+
+@st.cache_data(ttl=60)
 def load_folders():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT folder, name, age, profession, category FROM folders")
-    folders = [{"folder": r[0], "name": r[1], "age": r[2], "profession": r[3], "category": r[4]} for r in c.fetchall()]
-    conn.close()
-    return folders
+    with get_db_lock():
+        c = get_conn().cursor()
+        c.execute("SELECT folder, name, age, profession, category FROM folders")
+        # st.cache_data pickles its result and sqlite3.Row cannot be pickled
+        return [dict(r) for r in c]
 
 def add_folder(folder, name, age, profession, category):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO folders (folder, name, age, profession, category)
-            VALUES (?, ?, ?, ?, ?)
-        """, (folder, name, age, profession, category))
-        conn.commit()
-        conn.close()
+        conn = get_conn()
+        with get_db_lock(), conn:
+            conn.execute("""
+                INSERT INTO folders (folder, name, age, profession, category)
+                VALUES (?, ?, ?, ?, ?)
+            """, (folder, name, age, profession, category))
+        load_folders.clear()
         return True
     except sqlite3.IntegrityError:
         return False
@@ -101,88 +224,224 @@ def add_folder(folder, name, age, profession, category):
         st.error(f"Error adding folder: {str(e)}")
         return False
 
+@st.cache_resource
+def get_thumbnail_pool():
+    """Shared thread pool for upload processing (PIL releases the GIL while decoding and encoding)."""
+    return ThreadPoolExecutor(max_workers=os.cpu_count())
+
+def _process_upload(uploaded_file):
+    """Build one upload's thumbnail and recompressed copy on the pool; returns the exception on failure."""
+    try:
+        uploaded_file.seek(0)
+        # Decode once: the capped image feeds the recompressed copy, then shrinks into the thumbnail.
+        # The copy carries no EXIF, so bake the orientation into the pixels first.
+        img = ImageOps.exif_transpose(Image.open(uploaded_file))
+        if img.mode in ("P", "1"):
+            # Pillow resamples these modes with NEAREST whatever filter is asked for
+            img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+        img.thumbnail(MAX_IMAGE_SIZE, Image.Resampling.LANCZOS)
+        recompressed = recompress_upload(img, uploaded_file.size)
+        return make_thumbnail(img), recompressed
+    except Exception as e:
+        return e
+
+def _backfill_thumbnail(row):
+    """Build a thumbnail for a stored row on the pool; returns None for unreadable data."""
+    try:
+        return draft_thumbnail(row["image_data"]), row["id"]
+    except Exception:
+        return None
+
+def add_notice(kind, message):
+    """Queue a message for show_notices(); kind is "success" or "error".
+
+    Callbacks can't draw during a fragment rerun, and st.rerun() wipes anything
+    drawn before it, so messages go through session state instead.
+    """
+    st.session_state.setdefault("notices", []).append((kind, message))
+
+def show_notices():
+    """Show and clear the queued messages."""
+    for kind, message in st.session_state.pop("notices", []):
+        getattr(st, kind)(message)
+
 def load_images_to_db(uploaded_files, folder, download_allowed=True):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    for uploaded_file in uploaded_files:
-        image_data = uploaded_file.read()
-        extension = os.path.splitext(uploaded_file.name)[1].lower()
-        random_filename = f"{uuid.uuid4()}{extension}"
-        c.execute("SELECT COUNT(*) FROM images WHERE folder = ? AND name = ?", (folder, random_filename))
-        if c.fetchone()[0] == 0:
-            c.execute("INSERT INTO images (name, folder, image_data, download_allowed) VALUES (?, ?, ?, ?)",
-                      (random_filename, folder, image_data, download_allowed))
-    conn.commit()
-    conn.close()
-
-def update_download_permission(folder, image_name, download_allowed):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("UPDATE images SET download_allowed = ? WHERE folder = ? AND name = ?",
-              (download_allowed, folder, image_name))
-    conn.commit()
-    conn.close()
+    """Write uploads (capped at MAX_IMAGE_SIZE and recompressed, when smaller) to IMAGE_DIR and store their thumbnails; returns the number stored."""
+    # Files are named by UUID alone, so folder names never become part of a path
+    os.makedirs(IMAGE_DIR, exist_ok=True)
+    rows = []
+    written = []
+    try:
+        results = get_thumbnail_pool().map(_process_upload, uploaded_files)
+        for uploaded_file, result in zip(uploaded_files, results):
+            if isinstance(result, Exception):
+                add_notice("error", f"Error processing image {uploaded_file.name}: {type(result).__name__}")
+                continue
+            thumbnail, recompressed = result
+            if recompressed is not None:
+                image_data, extension = recompressed
+            else:
+                # getbuffer() is a view of the upload, so the image bytes are never copied
+                image_data = uploaded_file.getbuffer()
+                extension = os.path.splitext(uploaded_file.name)[1].lower()
+            # Names are fresh UUIDs; the unique (folder, name) index backs that up
+            random_filename = f"{uuid.uuid4()}{extension}"
+            path = os.path.join(IMAGE_DIR, random_filename)
+            with open(path, "wb") as f:
+                written.append(path)
+                f.write(image_data)
+            # image_data is NOT NULL in existing databases; on-disk images keep it empty
+            mime = MIME_TYPES.get(extension, "application/octet-stream")
+            rows.append((random_filename, folder, b"", download_allowed, path, thumbnail, mime))
+        conn = get_conn()
+        with get_db_lock(), conn:
+            c = conn.executemany("INSERT OR IGNORE INTO images (name, folder, image_data, download_allowed, path, thumbnail, mime) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                 rows)
+    except (OSError, sqlite3.Error) as e:
+        # Nothing was stored, so don't leave the files behind
+        for path in written:
+            if os.path.exists(path):
+                os.remove(path)
+        add_notice("error", f"Error storing images: {str(e)}")
+        return 0
+    clear_image_caches()
+    # Refresh planner statistics once the table has grown enough to need it;
+    # the rows are committed by now, so a failure here must not undo them
+    try:
+        with get_db_lock():
+            conn.execute("PRAGMA optimize")
+    except sqlite3.Error:
+        pass
+    return c.rowcount
+
+def update_download_permissions(folder, changes):
+    """Apply {image name: download_allowed} for one folder in a single transaction."""
+    conn = get_conn()
+    with get_db_lock(), conn:
+        conn.executemany("UPDATE images SET download_allowed = ? WHERE folder = ? AND name = ?",
+                         [(download_allowed, folder, name) for name, download_allowed in changes.items()])
+    clear_image_caches()
 
 def delete_image(folder, name):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("DELETE FROM images WHERE folder = ? AND name = ?", (folder, name))
-    conn.commit()
-    conn.close()
-
-def load_survey_data():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT folder, rating, feedback, timestamp FROM surveys")
-    survey_data = {}
-    for row in c.fetchall():
-        folder, rating, feedback, timestamp = row
-        if folder not in survey_data:
-            survey_data[folder] = []
-        survey_data[folder].append({"rating": rating, "feedback": feedback, "timestamp": timestamp})
-    conn.close()
-    return survey_data
+    conn = get_conn()
+    with get_db_lock(), conn:
+        c = conn.cursor()
+        c.execute("SELECT path FROM images WHERE folder = ? AND name = ?", (folder, name))
+        paths = [r["path"] for r in c.fetchall() if r["path"]]
+        c.execute("DELETE FROM images WHERE folder = ? AND name = ?", (folder, name))
+    clear_image_caches()
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+@st.cache_data(ttl=60)
+def get_surveys_page(folder, limit=SURVEY_PAGE_SIZE, offset=0):
+    """Return up to `limit` of a folder's survey entries, newest first, skipping the first `offset`."""
+    with get_db_lock():
+        c = get_conn().cursor()
+        c.execute("SELECT id, rating, feedback, timestamp FROM surveys WHERE folder = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+                  (folder, limit, offset))
+        return [dict(r) for r in c]
+
+@st.cache_data(ttl=60)
+def get_survey_stats():
+    """Return {folder: (average rating, number of ratings)} computed by SQLite."""
+    with get_db_lock():
+        c = get_conn().cursor()
+        c.execute("SELECT folder, AVG(rating) AS avg_rating, COUNT(*) AS review_count FROM surveys GROUP BY folder")
+        return {r["folder"]: (r["avg_rating"], r["review_count"]) for r in c}
 
 def save_survey_data(folder, rating, feedback, timestamp):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("INSERT INTO surveys (folder, rating, feedback, timestamp) VALUES (?, ?, ?, ?)",
-              (folder, rating, feedback, timestamp))
-    conn.commit()
-    conn.close()
-
-def delete_survey_entry(folder, timestamp):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("DELETE FROM surveys WHERE folder = ? AND timestamp = ?", (folder, timestamp))
-    conn.commit()
-    conn.close()
-
-def get_images(folder):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT name, image_data, download_allowed FROM images WHERE folder = ?", (folder,))
-    images = []
-    for r in c.fetchall():
-        name, data, download = r
-        try:
-            img = Image.open(io.BytesIO(data))
-            # Generate thumbnail
-            thumbnail = img.copy()
-            thumbnail.thumbnail((100, 100))
-            base64_image = image_to_base64(data)
-            images.append({
-                "name": name,
-                "image": img,
-                "thumbnail": thumbnail,
-                "data": data,
-                "download": download,
-                "base64": base64_image
-            })
-        except Exception as e:
-            st.error(f"Error loading image {name}: {str(e)}")
-    conn.close()
-    return images
+    conn = get_conn()
+    with get_db_lock(), conn:
+        conn.execute("INSERT INTO surveys (folder, rating, feedback, timestamp) VALUES (?, ?, ?, ?)",
+                     (folder, rating, feedback, timestamp))
+    get_surveys_page.clear()
+    get_survey_stats.clear()
+
+def delete_survey_entry(survey_id):
+    conn = get_conn()
+    with get_db_lock(), conn:
+        conn.execute("DELETE FROM surveys WHERE id = ?", (survey_id,))
+    get_surveys_page.clear()
+    get_survey_stats.clear()
+
+@st.cache_data(ttl=60)
+def list_image_meta(folder):
+    """Return name and download flag for a folder's images, without the image data.
+
+    Only the first bytes of each tile are read, to skip the same unreadable rows
+    get_thumbnails() does, so indexes line up with the grid.
+    """
+    with get_db_lock():
+        c = get_conn().cursor()
+        c.execute("SELECT name, download_allowed, substr(COALESCE(thumbnail, image_data), 1, 16) AS header "
+                  "FROM images WHERE folder = ? ORDER BY id", (folder,))
+        return [{"name": r["name"], "download": r["download_allowed"]} for r in c if has_image_header(r["header"])]
+
+def folder_has_images(folder):
+    with get_db_lock():
+        c = get_conn().cursor()
+        c.execute("SELECT EXISTS(SELECT 1 FROM images WHERE folder = ?)", (folder,))
+        return bool(c.fetchone()[0])
+
+def read_full_bytes(path, image_data):
+    """Return the full-size image data, reading it from disk when it is stored there."""
+    if path:
+        with open(path, "rb") as f:
+            return f.read()
+    return image_data
+
+def get_full_image(folder, name):
+    """Return (full-size bytes, MIME type) of a single image (for the zoom view and downloads)."""
+    with get_db_lock():
+        c = get_conn().cursor()
+        c.execute("SELECT path, image_data, mime FROM images WHERE folder = ? AND name = ?", (folder, name))
+        r = c.fetchone()
+    return read_full_bytes(r["path"], r["image_data"]), r["mime"]
+
+@st.cache_data(ttl=60, max_entries=32)
+def get_display_image(folder, name):
+    """Return bytes of a single image that st.image can forward unchanged (for the zoom view).
+
+    Stored files already are that, unless they are wider than DISPLAY_WIDTH, in
+    another format (an opaque PNG) or 16-bit; those get a scaled 8-bit copy.
+    """
+    image_data, _ = get_full_image(folder, name)
+    img = Image.open(io.BytesIO(image_data))
+    if img.width <= DISPLAY_WIDTH and img.format == ("PNG" if img.mode in ("RGBA", "LA", "P") else "JPEG"):
+        return image_data
+    img = to_8bit(ImageOps.exif_transpose(img))
+    img.thumbnail((DISPLAY_WIDTH, img.height), Image.Resampling.LANCZOS)
+    return display_bytes(img, quality=90)
+
+@st.cache_data(ttl=60)
+def get_thumbnails(folders):
+    """Return {folder: [name, thumbnail bytes, download flag]} for all given folders in one query."""
+    placeholders = ",".join("?" * len(folders))
+    with get_db_lock():
+        c = get_conn().cursor()
+        # Only legacy rows that could not be thumbnailed still fall back to their inline data
+        c.execute("SELECT folder, name, COALESCE(thumbnail, image_data) AS thumbnail, download_allowed "
+                  f"FROM images WHERE folder IN ({placeholders}) ORDER BY folder, id", tuple(folders))
+        rows = c.fetchall()
+    thumbnails = defaultdict(list)
+    for r in rows:
+        if not has_image_header(r["thumbnail"]):
+            st.error(f"Error loading image {r['name']}: not a JPEG or PNG image")
+            continue
+        thumbnails[r["folder"]].append({
+            "name": r["name"],
+            "thumbnail": r["thumbnail"],
+            "download": r["download_allowed"]
+        })
+    return dict(thumbnails)
+
+def clear_image_caches():
+    """Drop cached image listings after any write to the images table."""
+    get_thumbnails.clear()
+    list_image_meta.clear()
+    get_display_image.clear()
 
 # -------------------------------
 # Initialize DB & Session State
@@ -195,6 +454,31 @@ if "zoom_index" not in st.session_state:
 if "is_author" not in st.session_state:
     st.session_state.is_author = False
 
+# -------------------------------
+# Navigation Callbacks
+# -------------------------------
+def open_zoom(folder, idx):
+    st.session_state.zoom_folder = folder
+    st.session_state.zoom_index = idx
+
+def close_zoom():
+    st.session_state.zoom_folder = None
+    st.session_state.zoom_index = 0
+
+def step_zoom(delta):
+    st.session_state.zoom_index += delta
+
+def set_page(page_key, page):
+    st.session_state[page_key] = page
+
+def delete_zoomed_image(folder, name, idx):
+    delete_image(folder, name)
+    # Callbacks can't draw during a fragment rerun; the view shows this instead
+    add_notice("success", "Deleted.")
+    st.session_state.zoom_index = max(0, idx-1)
+    if not folder_has_images(folder):
+        close_zoom()
+
 # -------------------------------
 # Sidebar: Author Controls
 # -------------------------------
@@ -203,7 +487,9 @@ with st.sidebar:
     with st.form(key="login_form"):
         pwd = st.text_input("Password", type="password")
         if st.form_submit_button("Login", key="login_button"):
-            if pwd == "admin123":
+            if not ADMIN_HASH:
+                st.error("Author login is not configured (set ADMIN_HASH)")
+            elif check_admin_password(pwd):
                 st.session_state.is_author = True
                 st.success("Logged in as author!")
             else:
@@ -242,13 +528,14 @@ with st.sidebar:
         )
 
         if st.button("Upload to DB", key="upload_button") and uploaded_files:
-            load_images_to_db(uploaded_files, folder_choice, download_allowed)
-            st.success(f"{len(uploaded_files)} image(s) uploaded to '{folder_choice}'!")
+            stored = load_images_to_db(uploaded_files, folder_choice, download_allowed)
+            if stored:
+                add_notice("success", f"{stored} image(s) uploaded to '{folder_choice}'!")
             st.rerun()
 
         # Download Permissions
-        folder_choice_perm = st.selectbox("Select Folder for Download Settings", [item["folder"] for item in data], key=f"download_folder_{uuid.uuid4()}")
-        images = get_images(folder_choice_perm)
+        folder_choice_perm = st.selectbox("Select Folder for Download Settings", [item["folder"] for item in data], key="download_folder_perm")
+        images = list_image_meta(folder_choice_perm)
         if images:
             with st.form(key=f"download_permissions_form_{folder_choice_perm}"):
                 st.write("Toggle Download Permissions:")
@@ -261,40 +548,154 @@ with st.sidebar:
                         key=toggle_key
                     )
                 if st.form_submit_button("Apply Download Permissions", key=f"apply_permissions_{folder_choice_perm}"):
-                    for img_dict in images:
-                        if download_states[img_dict['name']] != img_dict["download"]:
-                            update_download_permission(folder_choice_perm, img_dict["name"], download_states[img_dict['name']])
+                    changes = {img_dict["name"]: download_states[img_dict["name"]] for img_dict in images
+                               if download_states[img_dict["name"]] != img_dict["download"]}
+                    if changes:
+                        update_download_permissions(folder_choice_perm, changes)
                     st.success("Download permissions updated!")
                     st.rerun()
 
 # -------------------------------
 # CSS Styling
 # -------------------------------
-st.markdown("""
-<style>
-.folder-card {background: #f9f9f9; border-radius: 8px; padding: 15px; margin-bottom: 20px; box-shadow: 0 4px 8px rgba(0,0,0,0.1);}
-.folder-header {font-size:1.5em; color:#333; margin-bottom:10px;}
-.image-grid {display:flex; flex-wrap:wrap; gap:10px;}
-img {border-radius:4px; max-width:100px; object-fit:cover;}
-</style>
-""", unsafe_allow_html=True)
+st.markdown(GALLERY_CSS, unsafe_allow_html=True)
+
+# -------------------------------
+# Fragments
+# -------------------------------
+# Paging, survey and zoom clicks rerun only their own fragment; switching
+# between grid and zoom still needs the full script.
+@st.fragment
+def render_folder_images(f, images):
+    if st.session_state.zoom_folder is not None:
+        st.rerun()
+    if images:
+        page_key = f"page_{f['folder']}"
+        page_count = (len(images) + GRID_PAGE_SIZE - 1) // GRID_PAGE_SIZE
+        page = min(st.session_state.get(page_key, 0), page_count - 1)
+        start = page * GRID_PAGE_SIZE
+        cols = st.columns(4)
+        for idx, img_dict in enumerate(images[start:start + GRID_PAGE_SIZE], start=start):
+            with cols[(idx - start) % 4]:
+                st.button("🔍 View", key=f"view_{f['folder']}_{idx}", on_click=open_zoom, args=(f["folder"], idx))
+                st.image(img_dict["thumbnail"], use_container_width=True, caption=f"Photo {idx+1}")
+
+        # Page controls
+        if page_count > 1:
+            col1, col2, col3 = st.columns([1,8,1])
+            with col1:
+                if page > 0:
+                    st.button("«", key=f"page_prev_{f['folder']}", on_click=set_page, args=(page_key, page - 1))
+            with col2:
+                st.caption(f"Page {page+1}/{page_count}")
+            with col3:
+                if page < page_count-1:
+                    st.button("»", key=f"page_next_{f['folder']}", on_click=set_page, args=(page_key, page + 1))
+    else:
+        st.warning(f"No images found for {f['folder']}")
+
+@st.fragment
+def render_folder_survey(f):
+    with st.form(key=f"survey_form_{f['folder']}"):
+        rating = st.slider("Rating (1-5)", 1, 5, 3, key=f"rating_{f['folder']}")
+        feedback = st.text_area("Feedback", key=f"feedback_{f['folder']}")
+        if st.form_submit_button("Submit", key=f"submit_survey_{f['folder']}"):
+            timestamp = datetime.now().isoformat()
+            save_survey_data(f["folder"], rating, feedback, timestamp)
+            st.success("✅ Response recorded")
+
+    # Show past survey results
+    survey_stats = get_survey_stats()
+    if f["folder"] in survey_stats:
+        st.write("### 📊 Previous Feedback:")
+
+        # Show average rating
+        avg_rating, review_count = survey_stats[f["folder"]]
+        st.markdown(f"**Average Rating:** ⭐ {avg_rating:.1f} ({review_count} reviews)")
+
+        # List the most recent responses with optional delete button
+        shown_key = f"surveys_shown_{f['folder']}"
+        shown = st.session_state.get(shown_key, SURVEY_PAGE_SIZE)
+        # Each page is cached on its own, so "Load more" only queries the new one
+        entries = [entry for offset in range(0, shown, SURVEY_PAGE_SIZE)
+                   for entry in get_surveys_page(f["folder"], offset=offset)]
+        for entry in entries:
+            cols = st.columns([6, 1])  # feedback + delete button
+            with cols[0]:
+                rating_display = "⭐" * entry["rating"]
+                st.markdown(
+                    f"- {rating_display} — {entry['feedback']}  \n"
+                    f"<sub>🕒 {entry['timestamp']}</sub>",
+                    unsafe_allow_html=True
+                )
+            if st.session_state.is_author:
+                with cols[1]:
+                    st.button("🗑️", key=f"delete_survey_{entry['id']}", on_click=delete_survey_entry, args=(entry["id"],))
+
+        if review_count > shown:
+            st.button("Load more", key=f"more_surveys_{f['folder']}",
+                      on_click=set_page, args=(shown_key, shown + SURVEY_PAGE_SIZE))
+    else:
+        st.info("No feedback yet — be the first to leave a comment!")
+
+@st.fragment
+def render_zoom(folder):
+    # Back, or deleting the last image, leaves zoom mode
+    if st.session_state.zoom_folder != folder:
+        st.rerun()
+    show_notices()
+    images = list_image_meta(folder)
+    if not images:
+        # Only unreadable rows are left in this folder
+        close_zoom()
+        st.rerun()
+    idx = st.session_state.zoom_index
+    if idx >= len(images):
+        idx = 0
+        st.session_state.zoom_index = 0
+    img_dict = images[idx]
+
+    st.subheader(f"🔍 Viewing {folder} ({idx+1}/{len(images)})")
+    st.image(get_display_image(folder, img_dict["name"]), use_container_width=True)
+
+    col1, col2, col3 = st.columns([1,8,1])
+    with col1:
+        if idx > 0:
+            st.button("◄ Previous", key=f"prev_{folder}_{idx}", on_click=step_zoom, args=(-1,))
+    with col3:
+        if idx < len(images)-1:
+            st.button("Next ►", key=f"next_{folder}_{idx}", on_click=step_zoom, args=(1,))
+
+    if img_dict["download"]:
+        # Only read the full file when it can actually be downloaded
+        image_data, mime = get_full_image(folder, img_dict["name"])
+        st.download_button("⬇️ Download", data=image_data, file_name=img_dict["name"], mime=mime, key=f"download_{folder}_{img_dict['name']}")
+
+    if st.session_state.is_author:
+        st.button("🗑️ Delete Image", key=f"delete_{folder}_{img_dict['name']}",
+                  on_click=delete_zoomed_image, args=(folder, img_dict["name"], idx))
+
+    st.button("⬅️ Back to Grid", key=f"back_{folder}_{idx}", on_click=close_zoom)
 
 # -------------------------------
 # Main App UI
 # -------------------------------
 st.title("📸 Interactive Photo Gallery & Survey")
+show_notices()
 
 data = load_folders()
-survey_data = load_survey_data()
-categories = sorted(set(item["category"] for item in data))
+folders_by_category = defaultdict(list)
+for item in data:
+    folders_by_category[item["category"]].append(item)
+categories = sorted(folders_by_category)
 tabs = st.tabs(categories)
 
 # Grid view
 if st.session_state.zoom_folder is None:
+    thumbnails = get_thumbnails(tuple(f["folder"] for f in data))
     for cat, tab in zip(categories, tabs):
         with tab:
-            cat_folders = [f for f in data if f["category"] == cat]
-            for f in cat_folders:
+            for f in folders_by_category[cat]:
                 st.markdown(
                     f'<div class="folder-card"><div class="folder-header">'
                     f'{f["name"]} ({f["age"]}, {f["profession"]})</div>',
@@ -302,96 +703,12 @@ if st.session_state.zoom_folder is None:
                 )
 
                 # Load images
-                images = get_images(f["folder"])
-                if images:
-                    cols = st.columns(4)
-                    for idx, img_dict in enumerate(images):
-                        with cols[idx % 4]:
-                            if st.button("🔍 View", key=f"view_{f['folder']}_{idx}"):
-                                st.session_state.zoom_folder = f["folder"]
-                                st.session_state.zoom_index = idx
-                                st.rerun()
-                            st.image(thumbnail_to_bytes(img_dict["thumbnail"]), use_container_width=True, caption=f"Photo {idx+1}")
-                else:
-                    st.warning(f"No images found for {f['folder']}")
+                render_folder_images(f, thumbnails.get(f["folder"], []))
 
                 # Survey form + previous feedback
                 with st.expander(f"📝 Survey for {f['name']}"):
-                    with st.form(key=f"survey_form_{f['folder']}"):
-                        rating = st.slider("Rating (1-5)", 1, 5, 3, key=f"rating_{f['folder']}")
-                        feedback = st.text_area("Feedback", key=f"feedback_{f['folder']}")
-                        if st.form_submit_button("Submit", key=f"submit_survey_{f['folder']}"):
-                            timestamp = datetime.now().isoformat()
-                            save_survey_data(f["folder"], rating, feedback, timestamp)
-                            st.success("✅ Response recorded")
-                            st.rerun()
-
-                    # Show past survey results
-                    if f["folder"] in survey_data and survey_data[f["folder"]]:
-                        st.write("### 📊 Previous Feedback:")
-
-                        # Calculate and show average rating
-                        ratings = [entry['rating'] for entry in survey_data[f["folder"]]]
-                        avg_rating = sum(ratings) / len(ratings)
-                        st.markdown(f"**Average Rating:** ⭐ {avg_rating:.1f} ({len(ratings)} reviews)")
-
-                        # List each past response with optional delete button
-                        for entry in survey_data[f["folder"]]:
-                            cols = st.columns([6, 1])  # feedback + delete button
-                            with cols[0]:
-                                rating_display = "⭐" * entry["rating"]
-                                st.markdown(
-                                    f"- {rating_display} — {entry['feedback']}  \n"
-                                    f"<sub>🕒 {entry['timestamp']}</sub>",
-                                    unsafe_allow_html=True
-                                )
-                            if st.session_state.is_author:
-                                with cols[1]:
-                                    if st.button("🗑️", key=f"delete_survey_{f['folder']}_{entry['timestamp']}"):
-                                        delete_survey_entry(f["folder"], entry["timestamp"])
-                                        st.success("Deleted comment.")
-                                        st.rerun()
-                    else:
-                        st.info("No feedback yet — be the first to leave a comment!")
+                    render_folder_survey(f)
 
 # Zoom view
 else:
-    folder = st.session_state.zoom_folder
-    images = get_images(folder)
-    idx = st.session_state.zoom_index
-    if idx >= len(images):
-        idx = 0
-        st.session_state.zoom_index = 0
-    img_dict = images[idx]
-
-    st.subheader(f"🔍 Viewing {folder} ({idx+1}/{len(images)})")
-    st.image(img_dict["image"], use_container_width=True)
-
-    col1, col2, col3 = st.columns([1,8,1])
-    with col1:
-        if idx > 0 and st.button("◄ Previous", key=f"prev_{folder}_{idx}"):
-            st.session_state.zoom_index -= 1
-            st.rerun()
-    with col3:
-        if idx < len(images)-1 and st.button("Next ►", key=f"next_{folder}_{idx}"):
-            st.session_state.zoom_index += 1
-            st.rerun()
-
-    if img_dict["download"]:
-        mime, _ = mimetypes.guess_type(img_dict["name"])
-        st.download_button("⬇️ Download", data=img_dict["data"], file_name=f"{uuid.uuid4()}{os.path.splitext(img_dict['name'])[1]}", mime=mime, key=f"download_{folder}_{img_dict['name']}")
-
-    if st.session_state.is_author:
-        if st.button("🗑️ Delete Image", key=f"delete_{folder}_{img_dict['name']}"):
-            delete_image(folder, img_dict["name"])
-            st.success("Deleted.")
-            st.session_state.zoom_index = max(0, idx-1)
-            if len(get_images(folder))==0:
-                st.session_state.zoom_folder = None
-                st.session_state.zoom_index = 0
-            st.rerun()
-
-    if st.button("⬅️ Back to Grid", key=f"back_{folder}_{idx}"):
-        st.session_state.zoom_folder = None
-        st.session_state.zoom_index = 0
-        st.rerun()
+    render_zoom(st.session_state.zoom_folder)